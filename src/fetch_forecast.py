@@ -1,220 +1,376 @@
 import time
 import sys
 import os
-import json
+import shutil
+import sqlite3
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
 import logging
 from logging.handlers import RotatingFileHandler
 import yaml
+from contextlib import closing
+from functools import lru_cache
+from itertools import chain, compress
+from operator import methodcaller
 from datetime import datetime
+from types import MappingProxyType, SimpleNamespace
 from zoneinfo import ZoneInfo
+from typing import Dict, Mapping, Optional, Tuple
 
 # ─── Setup paths and logging ───────────────────────────────────────────────────
 script_dir   = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
+log_dir      = os.path.join(project_root, "logs")
+data_dir     = os.path.join(project_root, "data", "processed")
+
+# All file locations, resolved once at import
+PATHS = SimpleNamespace(
+    config         = os.path.join(project_root, "config", "settings.yaml"),
+    log            = os.path.join(log_dir, "forecast_bot.log"),
+    seen           = os.path.join(data_dir, "seen_ids.db"),
+    legacy_seen    = os.path.join(data_dir, "seen_ids.json"),
+    dated_csv_tmpl = os.path.join(data_dir, "filtered_forecast_{date}.csv"),
+    latest_csv     = os.path.join(data_dir, "filtered_forecast.csv"),
+    validators     = os.path.join(data_dir, "forecast_cache.json"),
+)
+os.makedirs(log_dir, exist_ok=True)
+os.makedirs(data_dir, exist_ok=True)
 
 # Load configuration
-with open(os.path.join(project_root, "config", "settings.yaml")) as f:
+with open(PATHS.config) as f:
     cfg = yaml.safe_load(f)
 teams_webhook = os.getenv("TEAMS_WEBHOOK_URL") or cfg["teams"]["webhook_url"]
 
 # Configure logger
-log_dir  = os.path.join(project_root, "logs")
-os.makedirs(log_dir, exist_ok=True)
-log_path = os.path.join(log_dir, "forecast_bot.log")
 logger   = logging.getLogger("forecast_bot")
 logger.setLevel(logging.INFO)
-handler  = RotatingFileHandler(log_path, maxBytes=5 * 1024 * 1024, backupCount=3)
+handler  = RotatingFileHandler(PATHS.log, maxBytes=5 * 1024 * 1024, backupCount=3)
 handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
 logger.addHandler(handler)
 
-# Paths for data & seen-IDs
-data_dir      = os.path.join(project_root, "data", "processed")
-seen_ids_path = os.path.join(data_dir, "seen_ids.json")
-os.makedirs(data_dir, exist_ok=True)
-
-def fetch_forecast() -> pd.DataFrame:
+# Teams message constants, built once per process
+TZ           = ZoneInfo("America/New_York")
+SITE_URL     = "https://apfs-cloud.dhs.gov/forecast/"
+CSV_URL_TMPL = "https://github.com/Mvanhuffel/ForecastBot/releases/download/forecast-{date}/filtered_forecast_{date}.csv"
+LINK_TMPL    = (
+    "[Download the latest filtered CSV]({csv}) | "
+    "[Visit the APFS Forecast site]({site})<br/><br/>"
+)
+
+# Define target schema matching APFS site CSV
+DESIRED_COLUMNS = (
+    "APFS Number",
+    "NAICS",
+    "Component",
+    "Title",
+    "Contract Type",
+    "Contract Vehicle",
+    "Dollar Range",
+    "Small Business Set-Aside",
+    "Small Business Program",
+    "Contract Status",
+    "Contract Number",
+    "Contractor",
+    "Place of Performance City",
+    "Place of Performance State",
+    "Primary Contact First Name",
+    "Primary Contact Last Name",
+    "Primary Contact Phone",
+    "Primary Contact Email",
+    "Description",
+    "Award Quarter",
+    "Estimated Solicitation Release",
+    "Forecast Published",
+    "Forecast Previously Published"
+)
+
+# Map API JSON keys to APFS CSV headers
+RENAME_MAP = MappingProxyType({
+    # 1. APFS Number
+    "ID": "APFS Number",
+
+    # 2. NAICS
+    "NAICS": "NAICS",
+
+    # 3. Component
+    "ORGANIZATION": "Component",
+
+    # 4. Title
+    "REQUIREMENTS_TITLE": "Title",
+
+    # 5. Contract Type
+    "CONTRACT_TYPE": "Contract Type",
+
+    # 6. Contract Vehicle
+    "CONTRACT_VEHICLE": "Contract Vehicle",
+
+    # 7. Dollar Range
+    "DOLLAR_RANGE": "Dollar Range",
+
+    # 8. Small Business Set-Aside
+    "SMALL_BUSINESS_SET_ASIDE": "Small Business Set-Aside",
+
+    # 9. Small Business Program
+    "SMALL_BUSINESS_PROGRAM": "Small Business Program",
+
+    # 10. Contract Status
+    "CONTRACT_STATUS": "Contract Status",
+
+    # 11. Contract Number
+    "CONTRACT_NUMBER": "Contract Number",
+
+    # 12. Contractor
+    "CONTRACTOR": "Contractor",
+
+    # 13. Place of Performance City
+    "PLACE_OF_PERFORMANCE_CITY": "Place of Performance City",
+
+    # 14. Place of Performance State
+    "PLACE_OF_PERFORMANCE_STATE": "Place of Performance State",
+
+    # 15-18. Primary Contact First/Last/Phone/Email
+    "REQUIREMENTS_CONTACT_FIRST_NAME": "Primary Contact First Name",
+    "REQUIREMENTS_CONTACT_LAST_NAME": "Primary Contact Last Name",
+    "REQUIREMENTS_CONTACT_PHONE": "Primary Contact Phone",
+    "REQUIREMENTS_CONTACT_EMAIL": "Primary Contact Email",
+
+    # 19. Description (the full text of the requirement)
+    "REQUIREMENT": "Description",
+
+    # 20. Award Quarter
+    "AWARD_QUARTER": "Award Quarter",
+
+    # 21. Estimated Solicitation Release
+    "ESTIMATED_SOLICITATION_RELEASE_DATE": "Estimated Solicitation Release",
+
+    # 22. Forecast Published
+    "PUBLISH_DATE": "Forecast Published",
+
+    # 23. Forecast Previously Published
+    "PREVIOUS_PUBLISH_DATE": "Forecast Previously Published"
+})
+
+# API fields shown in the Teams summary blocks
+SUMMARY_COLUMNS = (
+    "ORGANIZATION",
+    "NAICS",
+    "ESTIMATED_PERIOD_OF_PERFORMANCE_START",
+    "DOLLAR_RANGE",
+    "COMPETITIVE",
+    "REQUIREMENT",
+)
+
+# Every API field the bot uses; the rest are dropped at parse time
+KEEP_COLUMNS = frozenset(RENAME_MAP) | frozenset(SUMMARY_COLUMNS)
+
+# Low-cardinality API fields stored as pandas categoricals
+LOW_CARD_COLS = (
+    "NAICS",
+    "ORGANIZATION",
+    "CONTRACT_TYPE",
+    "SMALL_BUSINESS_SET_ASIDE",
+    "COMPETITIVE",
+    "AWARD_QUARTER",
+)
+
+# Shared HTTP session: pooled keep-alive connections + retries on transient errors
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+SESSION.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+@lru_cache(maxsize=1)
+def schema_plan(api_cols: Tuple[str, ...]) -> Tuple[Tuple[str, ...], str, Mapping[str, str], Mapping[str, str]]:
+    columns   = tuple(c for c in api_cols if c.upper() in KEEP_COLUMNS)
+    naics_key = next((c for c in api_cols if c.upper() == "NAICS"), "NAICS")
+    renames   = MappingProxyType({c: c.upper() for c in columns if not c.isupper()})
+    # Compact dtypes: categoricals for low-cardinality fields (Arrow-backed elsewhere)
+    dtypes    = MappingProxyType({c.upper(): "category" for c in columns if c.upper() in LOW_CARD_COLS})
+    return columns, naics_key, renames, dtypes
+
+def fetch_forecast(naics: str, validators: Dict[str, str]) -> Tuple[Optional[pd.DataFrame], Dict[str, str]]:
     ts  = int(time.time() * 1000)
     url = f"https://apfs-cloud.dhs.gov/api/forecast/?_={ts}"
-    r   = requests.get(url)
+    # Conditional GET: let the server answer 304 if the feed hasn't changed
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    r   = SESSION.get(url, headers=headers, timeout=(3.05, 30))
+    if r.status_code == 304:
+        return None, validators
     r.raise_for_status()
-    return pd.DataFrame(r.json())
+    new_validators = {
+        key: value
+        for key, value in (("etag", r.headers.get("ETag")), ("last_modified", r.headers.get("Last-Modified")))
+        if value
+    }
+
+    # Filter the parsed records before building a DataFrame, so only the
+    # matching rows and the columns we use are ever materialized in pandas
+    records   = orjson.loads(r.content)
+    # Union of keys across all records, in first-seen order (as pd.DataFrame(records) would)
+    api_cols  = tuple(dict.fromkeys(chain.from_iterable(records)))
+    logger.info(f"Available columns from API: {sorted(api_cols)}")
+    columns, naics_key, renames, dtypes = schema_plan(api_cols)
+    naics_arr = np.fromiter(map(methodcaller("get", naics_key), records), dtype=object, count=len(records))
+    df = pd.DataFrame(list(compress(records, naics_arr == naics)), columns=list(columns))
+
+    # Normalize to the uppercase API keys and compact dtypes
+    if renames:
+        df = df.rename(columns=renames)
+    df = df.astype(dict(dtypes)).convert_dtypes(dtype_backend="pyarrow")
+    return df, new_validators
+
+def dollar_range_names(dr: pd.Series) -> pd.Series:
+    dr = dr.astype(object)
+    is_dict = dr.map(type).eq(dict)
+    names = dr.copy()
+    # .str only accepts string/dict values, so apply it to the dict rows alone
+    if is_dict.any():
+        names[is_dict] = dr[is_dict].str.get("display_name")
+    return names
+
+def as_text(col: pd.Series) -> pd.Series:
+    # astype(str) alone renders NA as "<NA>"/"nan" (pandas 2.x) or keeps it
+    # missing (pandas 3), so blank out missing values explicitly first
+    return col.astype(object).where(col.notna(), None).astype(str)
+
+def write_csv(df: pd.DataFrame, path: str):
+    # Arrow can't write nested values (e.g. the DOLLAR_RANGE dict) to CSV,
+    # so render them the way pandas.to_csv would
+    nested = {
+        col: df[col].map(lambda v: str(v) if isinstance(v, (dict, list)) else v)
+        for col in df.select_dtypes(include="object").columns
+    }
+    try:
+        table = pa.Table.from_pandas(df.assign(**nested), preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type columns: fall back to the pandas writer
+        df.to_csv(path, index=False)
+        return
+    pacsv.write_csv(table, path)
+
+def publish_latest(src: str, dst: str):
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        # Same-day rerun: already linked, and rename() is a no-op between links
+        return
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        # Hard links unsupported (e.g. some Windows/network filesystems)
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
 
 def post_to_teams(webhook_url: str, message: str):
     payload = {"text": message}
-    resp = requests.post(webhook_url, json=payload)
+    resp = SESSION.post(webhook_url, json=payload, timeout=(3.05, 10))
     resp.raise_for_status()
     logger.info("Posted notification to Teams")
 
+def connect_seen_db() -> sqlite3.Connection:
+    conn = sqlite3.connect(PATHS.seen)
+    # id is deliberately untyped: a TEXT column would store the API's integer
+    # IDs as strings, and they would no longer match on load
+    conn.execute("CREATE TABLE IF NOT EXISTS seen (id PRIMARY KEY, first_seen TEXT)")
+    # One-time import of the old sorted-JSON state file
+    if conn.execute("SELECT 1 FROM seen LIMIT 1").fetchone() is None:
+        try:
+            with open(PATHS.legacy_seen, "rb") as f:
+                legacy = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            legacy = []
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO seen (id) VALUES (?)", ((i,) for i in legacy))
+    return conn
+
 def load_seen_ids() -> set:
+    with closing(connect_seen_db()) as conn:
+        return {row_id for (row_id,) in conn.execute("SELECT id FROM seen")}
+
+def save_seen_ids(new_ids: list, today: str):
+    with closing(connect_seen_db()) as conn, conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO seen (id, first_seen) VALUES (?, ?)",
+            ((row_id, today) for row_id in new_ids),
+        )
+
+def load_validators() -> Dict[str, str]:
     try:
-        with open(seen_ids_path) as f:
-            return set(json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return set()
+        with open(PATHS.validators, "rb") as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return {}
 
-def save_seen_ids(seen: set):
-    with open(seen_ids_path, "w") as f:
-        json.dump(sorted(seen), f)
+def save_validators(validators: Dict[str, str]):
+    with open(PATHS.validators, "wb") as f:
+        f.write(orjson.dumps(validators, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
 
 def main():
     logger.info("Run started")
+    now   = datetime.now(TZ)
+    today = now.strftime("%Y-%m-%d")
     try:
-        # Fetch & normalize
-        df = fetch_forecast()
-        logger.info(f"Available columns from API: {sorted(df.columns.tolist())}")
-        df.columns = df.columns.str.upper()
-
-        # Filter on NAICS
+        # Fetch the target NAICS rows, already normalized
         target      = "541612 - Human Resources Consulting Services"
-        df_filtered = df[df["NAICS"] == target]
+        df_filtered, validators = fetch_forecast(target, load_validators())
+        if df_filtered is None:
+            logger.info("Forecast unchanged since last run—nothing to do.")
+            return
         logger.info(f"Rows after filter: {len(df_filtered)}")
 
         # Determine newly unseen rows
         seen_ids = load_seen_ids()
-        ids_list = df_filtered["ID"].tolist()
-        mask     = [row_id not in seen_ids for row_id in ids_list]
-        new_df   = df_filtered.loc[mask]
+        ids_arr  = df_filtered["ID"].to_numpy()
+        seen_arr = np.fromiter(seen_ids, dtype=ids_arr.dtype, count=len(seen_ids))
+        mask     = ~np.isin(ids_arr, seen_arr, assume_unique=True)
+        new_df   = df_filtered.iloc[mask]
 
         if new_df.shape[0] == 0:
             logger.info("No new opportunities—nothing to post.")
+            save_validators(validators)
             return
 
         # Write full filtered CSV with date-based filename
-        today = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d")
-        dated_output_path = os.path.join(data_dir, f"filtered_forecast_{today}.csv")
-        latest_output_path = os.path.join(data_dir, "filtered_forecast.csv")
+        dated_output_path = PATHS.dated_csv_tmpl.format(date=today)
+        latest_output_path = PATHS.latest_csv
         
-        # Define target schema matching APFS site CSV
-        desired_columns = [
-            "APFS Number",
-            "NAICS",
-            "Component",
-            "Title",
-            "Contract Type",
-            "Contract Vehicle",
-            "Dollar Range",
-            "Small Business Set-Aside",
-            "Small Business Program",
-            "Contract Status",
-            "Contract Number",
-            "Contractor",
-            "Place of Performance City",
-            "Place of Performance State",
-            "Primary Contact First Name",
-            "Primary Contact Last Name",
-            "Primary Contact Phone",
-            "Primary Contact Email",
-            "Description",
-            "Award Quarter",
-            "Estimated Solicitation Release",
-            "Forecast Published",
-            "Forecast Previously Published"
-        ]
-
-        # Map API JSON keys to APFS CSV headers
-        rename_map = {
-            # 1. APFS Number
-            "ID": "APFS Number",
-
-            # 2. NAICS
-            "NAICS": "NAICS",
-
-            # 3. Component
-            "ORGANIZATION": "Component",
-
-            # 4. Title
-            "REQUIREMENTS_TITLE": "Title",
-
-            # 5. Contract Type
-            "CONTRACT_TYPE": "Contract Type",
-
-            # 6. Contract Vehicle
-            "CONTRACT_VEHICLE": "Contract Vehicle",
-
-            # 7. Dollar Range
-            "DOLLAR_RANGE": "Dollar Range",
-
-            # 8. Small Business Set-Aside
-            "SMALL_BUSINESS_SET_ASIDE": "Small Business Set-Aside",
-
-            # 9. Small Business Program
-            "SMALL_BUSINESS_PROGRAM": "Small Business Program",
-
-            # 10. Contract Status
-            "CONTRACT_STATUS": "Contract Status",
-
-            # 11. Contract Number
-            "CONTRACT_NUMBER": "Contract Number",
-
-            # 12. Contractor
-            "CONTRACTOR": "Contractor",
-
-            # 13. Place of Performance City
-            "PLACE_OF_PERFORMANCE_CITY": "Place of Performance City",
-
-            # 14. Place of Performance State
-            "PLACE_OF_PERFORMANCE_STATE": "Place of Performance State",
-
-            # 15-18. Primary Contact First/Last/Phone/Email
-            "REQUIREMENTS_CONTACT_FIRST_NAME": "Primary Contact First Name",
-            "REQUIREMENTS_CONTACT_LAST_NAME": "Primary Contact Last Name",
-            "REQUIREMENTS_CONTACT_PHONE": "Primary Contact Phone",
-            "REQUIREMENTS_CONTACT_EMAIL": "Primary Contact Email",
-
-            # 19. Description (the full text of the requirement)
-            "REQUIREMENT": "Description",
-
-            # 20. Award Quarter
-            "AWARD_QUARTER": "Award Quarter",
-
-            # 21. Estimated Solicitation Release
-            "ESTIMATED_SOLICITATION_RELEASE_DATE": "Estimated Solicitation Release",
-
-            # 22. Forecast Published
-            "PUBLISH_DATE": "Forecast Published",
-
-            # 23. Forecast Previously Published
-            "PREVIOUS_PUBLISH_DATE": "Forecast Previously Published"
-        }
-
         # Transform DataFrame to match APFS CSV structure
-        df_export = df_filtered.rename(mapper=rename_map, axis=1)  # type: ignore
-        df_export = df_export[desired_columns]
+        df_export = df_filtered.rename(columns=RENAME_MAP).reindex(columns=DESIRED_COLUMNS)
         
         # Write to dated file
-        df_export.to_csv(dated_output_path, index=False)
+        write_csv(df_export, dated_output_path)
         logger.info(f"Wrote filtered data to {dated_output_path}")
         
         # Copy to latest
-        df_export.to_csv(latest_output_path, index=False)
+        publish_latest(dated_output_path, latest_output_path)
         logger.info(f"Updated latest filtered data at {latest_output_path}")
 
-        # Build HTML summary blocks for new_df
-        cols   = [
-            "ORGANIZATION",
-            "NAICS",
-            "ESTIMATED_PERIOD_OF_PERFORMANCE_START",
-            "DOLLAR_RANGE",
-            "COMPETITIVE",
-            "REQUIREMENT",
-        ]
-        blocks = []
-        for _, row in new_df[cols].iterrows():
-            dr      = row["DOLLAR_RANGE"]
-            dr_name = dr.get("display_name") if isinstance(dr, dict) else dr
-            blocks.append(
-                f"**Organization:** {row['ORGANIZATION']}<br/>"
-                f"**NAICS:** {row['NAICS']}<br/>"
-                f"**Est. Start:** {row['ESTIMATED_PERIOD_OF_PERFORMANCE_START']}<br/>"
-                f"**Dollar Range:** {dr_name}<br/>"
-                f"**Competitive:** {row['COMPETITIVE']}<br/>"
-                f"**Requirement:** {row['REQUIREMENT']}<br/>"
-            )
+        # Build HTML summary blocks for new_df (column-wise, no per-row loop)
+        dr_name = dollar_range_names(new_df["DOLLAR_RANGE"])
+        blocks = (
+            "**Organization:** " + as_text(new_df["ORGANIZATION"]) + "<br/>"
+            + "**NAICS:** " + as_text(new_df["NAICS"]) + "<br/>"
+            + "**Est. Start:** " + as_text(new_df["ESTIMATED_PERIOD_OF_PERFORMANCE_START"]) + "<br/>"
+            + "**Dollar Range:** " + as_text(dr_name) + "<br/>"
+            + "**Competitive:** " + as_text(new_df["COMPETITIVE"]) + "<br/>"
+            + "**Requirement:** " + as_text(new_df["REQUIREMENT"]) + "<br/>"
+        ).tolist()
 
         # Header with timestamp
-        now    = datetime.now(ZoneInfo("America/New_York"))
         pulled = now.strftime("%B %d, %Y at %I:%M %p ET")
         header = (
             f"✅ **Forecast Bot Summary** ({len(blocks)} new opportunities)<br/>"
@@ -222,21 +378,15 @@ def main():
         )
 
         # Links immediately after header on the same level, with pipe separator
-        dated_tag = f"forecast-{today}"
-        csv_url = f"https://github.com/Mvanhuffel/ForecastBot/releases/download/{dated_tag}/filtered_forecast_{today}.csv"
-        site_url = "https://apfs-cloud.dhs.gov/forecast/"
-        links_html = (
-            f"[Download the latest filtered CSV]({csv_url}) | "
-            f"[Visit the APFS Forecast site]({site_url})<br/><br/>"
-        )
+        links_html = LINK_TMPL.format(csv=CSV_URL_TMPL.format(date=today), site=SITE_URL)
 
         # Combine and post: header → links → details
         message = header + links_html + "<br/><br/>".join(blocks)
         post_to_teams(teams_webhook, message)
 
         # Persist seen IDs
-        seen_ids |= set(new_df["ID"])
-        save_seen_ids(seen_ids)
+        save_seen_ids(new_df["ID"].tolist(), today)
+        save_validators(validators)
 
         logger.info("Run completed successfully")
 
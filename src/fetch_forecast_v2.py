@@ -1,232 +1,446 @@
+import ast
 import time
 import sys
 import os
-import json
+import shutil
+import sqlite3
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pacsv
 import logging
 from logging.handlers import RotatingFileHandler
 import yaml
+from contextlib import closing
+from functools import lru_cache
+from itertools import chain, compress
+from operator import methodcaller
 from datetime import datetime
+from types import MappingProxyType, SimpleNamespace
 from zoneinfo import ZoneInfo
-from typing import Dict, Set, Tuple, Optional
+from typing import Dict, Mapping, Tuple, Optional
 
 # ─── Setup paths and logging ───────────────────────────────────────────────────
 script_dir   = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
+log_dir      = os.path.join(project_root, "logs")
+data_dir     = os.path.join(project_root, "data", "processed")
+
+# All file locations, resolved once at import
+PATHS = SimpleNamespace(
+    config         = os.path.join(project_root, "config", "settings.yaml"),
+    log            = os.path.join(log_dir, "forecast_bot.log"),
+    seen           = os.path.join(data_dir, "seen_ids_v2.db"),
+    legacy_seen    = os.path.join(data_dir, "seen_ids_v2.json"),
+    dated_csv_tmpl = os.path.join(data_dir, "filtered_forecast_{date}.csv"),
+    latest_csv     = os.path.join(data_dir, "filtered_forecast.csv"),
+    validators     = os.path.join(data_dir, "forecast_cache_v2.json"),
+)
+os.makedirs(log_dir, exist_ok=True)
+os.makedirs(data_dir, exist_ok=True)
 
 # Load configuration
-with open(os.path.join(project_root, "config", "settings.yaml")) as f:
+with open(PATHS.config) as f:
     cfg = yaml.safe_load(f)
 teams_webhook = os.getenv("TEAMS_WEBHOOK_URL") or cfg["teams"]["webhook_url"]
 
 # Configure logger
-log_dir  = os.path.join(project_root, "logs")
-os.makedirs(log_dir, exist_ok=True)
-log_path = os.path.join(log_dir, "forecast_bot.log")
 logger   = logging.getLogger("forecast_bot")
 logger.setLevel(logging.INFO)
-handler  = RotatingFileHandler(log_path, maxBytes=5 * 1024 * 1024, backupCount=3)
+handler  = RotatingFileHandler(PATHS.log, maxBytes=5 * 1024 * 1024, backupCount=3)
 handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
 logger.addHandler(handler)
 
-# Paths for data & seen-IDs
-data_dir      = os.path.join(project_root, "data", "processed")
-seen_ids_path = os.path.join(data_dir, "seen_ids_v2.json")
-os.makedirs(data_dir, exist_ok=True)
+# Teams message constants, built once per process
+TZ           = ZoneInfo("America/New_York")
+SITE_URL     = "https://apfs-cloud.dhs.gov/forecast/"
+CSV_URL_TMPL = "https://github.com/Mvanhuffel/ForecastBot/releases/download/forecast-{date}/filtered_forecast_{date}.csv"
+LINK_TMPL    = (
+    "[Download the latest filtered CSV]({csv}) | "
+    "[Visit the APFS Forecast site]({site})<br/><br/>"
+)
+
+# Target schema matching the APFS site CSV, and API JSON keys mapped onto it
+DESIRED_COLUMNS = (
+    "APFS Number", "NAICS", "Component", "Title", "Contract Type",
+    "Contract Vehicle", "Dollar Range", "Small Business Set-Aside",
+    "Small Business Program", "Contract Status", "Contract Number",
+    "Contractor", "Place of Performance City", "Place of Performance State",
+    "Primary Contact First Name", "Primary Contact Last Name",
+    "Primary Contact Phone", "Primary Contact Email", "Description",
+    "Award Quarter", "Estimated Solicitation Release",
+    "Forecast Published", "Forecast Previously Published"
+)
+
+RENAME_MAP = MappingProxyType({
+    "ID": "APFS Number",
+    "NAICS": "NAICS",
+    "ORGANIZATION": "Component",
+    "REQUIREMENTS_TITLE": "Title",
+    "CONTRACT_TYPE": "Contract Type",
+    "CONTRACT_VEHICLE": "Contract Vehicle",
+    "DOLLAR_RANGE": "Dollar Range",
+    "SMALL_BUSINESS_SET_ASIDE": "Small Business Set-Aside",
+    "SMALL_BUSINESS_PROGRAM": "Small Business Program",
+    "CONTRACT_STATUS": "Contract Status",
+    "CONTRACT_NUMBER": "Contract Number",
+    "CONTRACTOR": "Contractor",
+    "PLACE_OF_PERFORMANCE_CITY": "Place of Performance City",
+    "PLACE_OF_PERFORMANCE_STATE": "Place of Performance State",
+    "REQUIREMENTS_CONTACT_FIRST_NAME": "Primary Contact First Name",
+    "REQUIREMENTS_CONTACT_LAST_NAME": "Primary Contact Last Name",
+    "REQUIREMENTS_CONTACT_PHONE": "Primary Contact Phone",
+    "REQUIREMENTS_CONTACT_EMAIL": "Primary Contact Email",
+    "REQUIREMENT": "Description",
+    "AWARD_QUARTER": "Award Quarter",
+    "ESTIMATED_SOLICITATION_RELEASE_DATE": "Estimated Solicitation Release",
+    "PUBLISH_DATE": "Forecast Published",
+    "PREVIOUS_PUBLISH_DATE": "Forecast Previously Published"
+})
+
+# Reverse lookup: APFS CSV header -> API JSON key
+API_COLUMNS = MappingProxyType({v: k for k, v in RENAME_MAP.items()})
+
+# API fields shown in the Teams summary blocks
+SUMMARY_COLUMNS = (
+    "ORGANIZATION",
+    "NAICS",
+    "ESTIMATED_PERIOD_OF_PERFORMANCE_START",
+    "DOLLAR_RANGE",
+    "COMPETITIVE",
+    "REQUIREMENT",
+)
+
+# CSV headers read back from the latest export when reporting disappeared rows
+HISTORY_COLUMNS = tuple(RENAME_MAP[c] for c in ("ID",) + SUMMARY_COLUMNS if c in RENAME_MAP)
+
+# Every API field the bot uses; the rest are dropped at parse time
+KEEP_COLUMNS = frozenset(RENAME_MAP) | frozenset(SUMMARY_COLUMNS)
 
-def fetch_forecast() -> pd.DataFrame:
+# Low-cardinality API fields stored as pandas categoricals
+LOW_CARD_COLS = (
+    "NAICS",
+    "ORGANIZATION",
+    "CONTRACT_TYPE",
+    "SMALL_BUSINESS_SET_ASIDE",
+    "COMPETITIVE",
+    "AWARD_QUARTER",
+)
+
+# Shared HTTP session: pooled keep-alive connections + retries on transient errors
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+SESSION.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+@lru_cache(maxsize=1)
+def schema_plan(api_cols: Tuple[str, ...]) -> Tuple[Tuple[str, ...], str, Mapping[str, str], Mapping[str, str]]:
+    """Column plan for an API schema: kept columns, NAICS key, uppercase renames, dtypes"""
+    columns   = tuple(c for c in api_cols if c.upper() in KEEP_COLUMNS)
+    naics_key = next((c for c in api_cols if c.upper() == "NAICS"), "NAICS")
+    renames   = MappingProxyType({c: c.upper() for c in columns if not c.isupper()})
+    # Compact dtypes: categoricals for low-cardinality fields (Arrow-backed elsewhere)
+    dtypes    = MappingProxyType({c.upper(): "category" for c in columns if c.upper() in LOW_CARD_COLS})
+    return columns, naics_key, renames, dtypes
+
+def fetch_forecast(naics: str, validators: Dict[str, str]) -> Tuple[Optional[pd.DataFrame], Dict[str, str]]:
+    """Fetch the APFS forecast for one NAICS; the frame is None if the feed is unchanged (HTTP 304)"""
     ts  = int(time.time() * 1000)
     url = f"https://apfs-cloud.dhs.gov/api/forecast/?_={ts}"
-    r   = requests.get(url)
+    # Conditional GET: let the server answer 304 if the feed hasn't changed
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    r   = SESSION.get(url, headers=headers, timeout=(3.05, 30))
+    if r.status_code == 304:
+        return None, validators
     r.raise_for_status()
-    return pd.DataFrame(r.json())
+    new_validators = {
+        key: value
+        for key, value in (("etag", r.headers.get("ETag")), ("last_modified", r.headers.get("Last-Modified")))
+        if value
+    }
+
+    # Filter the parsed records before building a DataFrame, so only the
+    # matching rows and the columns we use are ever materialized in pandas
+    records   = orjson.loads(r.content)
+    # Union of keys across all records, in first-seen order (as pd.DataFrame(records) would)
+    api_cols  = tuple(dict.fromkeys(chain.from_iterable(records)))
+    logger.info(f"Available columns from API: {sorted(api_cols)}")
+    columns, naics_key, renames, dtypes = schema_plan(api_cols)
+    naics_arr = np.fromiter(map(methodcaller("get", naics_key), records), dtype=object, count=len(records))
+    df = pd.DataFrame(list(compress(records, naics_arr == naics)), columns=list(columns))
+
+    # Normalize to the uppercase API keys and compact dtypes
+    if renames:
+        df = df.rename(columns=renames)
+    df = df.astype(dict(dtypes)).convert_dtypes(dtype_backend="pyarrow")
+    return df, new_validators
+
+def write_csv(df: pd.DataFrame, path: str):
+    """Write a DataFrame to CSV with pyarrow's C++ writer"""
+    # Arrow can't write nested values (e.g. the DOLLAR_RANGE dict) to CSV,
+    # so render them the way pandas.to_csv would
+    nested = {
+        col: df[col].map(lambda v: str(v) if isinstance(v, (dict, list)) else v)
+        for col in df.select_dtypes(include="object").columns
+    }
+    try:
+        table = pa.Table.from_pandas(df.assign(**nested), preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type columns: fall back to the pandas writer
+        df.to_csv(path, index=False)
+        return
+    pacsv.write_csv(table, path)
+
+def publish_latest(src: str, dst: str):
+    """Point the latest CSV at the dated one without serializing it again"""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        # Same-day rerun: already linked, and rename() is a no-op between links
+        return
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        # Hard links unsupported (e.g. some Windows/network filesystems)
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
 
 def post_to_teams(webhook_url: str, message: str):
     payload = {"text": message}
-    resp = requests.post(webhook_url, json=payload)
+    resp = SESSION.post(webhook_url, json=payload, timeout=(3.05, 10))
     resp.raise_for_status()
     logger.info("Posted notification to Teams")
 
+def connect_seen_db() -> sqlite3.Connection:
+    """Open the seen-IDs database, importing the legacy JSON state on first use"""
+    conn = sqlite3.connect(PATHS.seen)
+    conn.execute("CREATE TABLE IF NOT EXISTS seen (id TEXT PRIMARY KEY, last_seen TEXT NOT NULL)")
+    if conn.execute("SELECT 1 FROM seen LIMIT 1").fetchone() is None:
+        try:
+            with open(PATHS.legacy_seen, "rb") as f:
+                legacy = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            legacy = {}
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO seen (id, last_seen) VALUES (?, ?)", legacy.items())
+    return conn
+
 def load_seen_ids() -> Dict[str, str]:
     """Load seen IDs with their last seen date"""
+    with closing(connect_seen_db()) as conn:
+        return dict(conn.execute("SELECT id, last_seen FROM seen"))
+
+def save_seen_ids(updates: Dict[str, str]):
+    """Upsert the given seen IDs with their last seen date"""
+    with closing(connect_seen_db()) as conn, conn:
+        conn.executemany(
+            "INSERT INTO seen (id, last_seen) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET last_seen = excluded.last_seen",
+            updates.items(),
+        )
+
+def load_validators() -> Dict[str, str]:
+    """Load the ETag/Last-Modified validators from the last successful fetch"""
     try:
-        with open(seen_ids_path) as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+        with open(PATHS.validators, "rb") as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
         return {}
 
-def save_seen_ids(seen: Dict[str, str]):
-    """Save seen IDs with their last seen date"""
-    with open(seen_ids_path, "w") as f:
-        json.dump(seen, f, indent=2)
+def save_validators(validators: Dict[str, str]):
+    """Save the ETag/Last-Modified validators for the next conditional fetch"""
+    with open(PATHS.validators, "wb") as f:
+        f.write(orjson.dumps(validators, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+
+def as_text(col: pd.Series) -> pd.Series:
+    """Render a column as display text, with missing values shown as None"""
+    # astype(str) alone renders NA as "<NA>"/"nan" (pandas 2.x) or keeps it
+    # missing (pandas 3), so blank out missing values explicitly first
+    return col.astype(object).where(col.notna(), None).astype(str)
+
+def parse_dollar_range(value):
+    """Turn a DOLLAR_RANGE dict stored as its repr in the CSV export back into a dict"""
+    if isinstance(value, str) and value.startswith("{"):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+    return value
+
+def dollar_range_names(dr: pd.Series) -> pd.Series:
+    """Return the display_name of DOLLAR_RANGE dicts, passing other values through"""
+    dr = dr.astype(object)
+    is_dict = dr.map(type).eq(dict)
+    names = dr.copy()
+    # .str only accepts string/dict values, so apply it to the dict rows alone
+    if is_dict.any():
+        names[is_dict] = dr[is_dict].str.get("display_name")
+    return names
 
-def format_opportunity_block(row: pd.Series) -> str:
-    """Format a single opportunity into an HTML block for Teams"""
-    dr = row["DOLLAR_RANGE"]
-    dr_name = dr.get("display_name") if isinstance(dr, dict) else dr
+def format_opportunity_blocks(df: pd.DataFrame) -> pd.Series:
+    """Format opportunities into HTML blocks for Teams, one per row"""
+    dr_name = dollar_range_names(df["DOLLAR_RANGE"])
     return (
-        f"**Organization:** {row['ORGANIZATION']}<br/>"
-        f"**NAICS:** {row['NAICS']}<br/>"
-        f"**Est. Start:** {row['ESTIMATED_PERIOD_OF_PERFORMANCE_START']}<br/>"
-        f"**Dollar Range:** {dr_name}<br/>"
-        f"**Competitive:** {row['COMPETITIVE']}<br/>"
-        f"**Requirement:** {row['REQUIREMENT']}<br/>"
+        "**Organization:** " + as_text(df["ORGANIZATION"]) + "<br/>"
+        + "**NAICS:** " + as_text(df["NAICS"]) + "<br/>"
+        + "**Est. Start:** " + as_text(df["ESTIMATED_PERIOD_OF_PERFORMANCE_START"]) + "<br/>"
+        + "**Dollar Range:** " + as_text(dr_name) + "<br/>"
+        + "**Competitive:** " + as_text(df["COMPETITIVE"]) + "<br/>"
+        + "**Requirement:** " + as_text(df["REQUIREMENT"]) + "<br/>"
     )
 
-def format_disappeared_block(row: pd.Series, last_seen: str) -> str:
-    """Format a disappeared opportunity into an HTML block for Teams"""
-    block = format_opportunity_block(row)
-    return f"{block}**Last Seen:** {last_seen}<br/>"
+def format_disappeared_blocks(df: pd.DataFrame, seen_ids: Dict[str, str]) -> pd.Series:
+    """Format disappeared opportunities into HTML blocks for Teams, one per row"""
+    last_seen = df["ID"].astype(str).map(seen_ids)
+    return format_opportunity_blocks(df) + "**Last Seen:** " + as_text(last_seen) + "<br/>"
 
-def get_header(count: int, type_str: str) -> str:
-    """Generate header for Teams message"""
-    now = datetime.now(ZoneInfo("America/New_York"))
+def get_header(counts: Dict[str, int], now: datetime) -> str:
+    """Generate the combined header for Teams message, e.g. (2 new, 1 disappeared)"""
     pulled = now.strftime("%B %d, %Y at %I:%M %p ET")
-    emoji = "✅" if type_str == "new" else "❌"
+    summary = ", ".join(f"{count} {type_str}" for type_str, count in counts.items())
+    if len(counts) > 1:
+        emoji = "📋"
+    else:
+        emoji = "✅" if "new" in counts else "❌"
     return (
-        f"{emoji} **Forecast Bot {type_str.title()} Opportunities** ({count} {type_str})<br/>"
+        f"{emoji} **Forecast Bot Summary** ({summary})<br/>"
         f"{pulled}<br/>"
     )
 
+def get_section_header(count: int, type_str: str) -> str:
+    """Generate the header for one category section of the Teams message"""
+    emoji = "✅" if type_str == "new" else "❌"
+    return f"{emoji} **{type_str.title()} Opportunities** ({count})<br/><br/>"
+
 def get_links_html(today: str) -> str:
     """Generate links section for Teams message"""
-    dated_tag = f"forecast-{today}"
-    csv_url = f"https://github.com/Mvanhuffel/ForecastBot/releases/download/{dated_tag}/filtered_forecast_{today}.csv"
-    site_url = "https://apfs-cloud.dhs.gov/forecast/"
-    return (
-        f"[Download the latest filtered CSV]({csv_url}) | "
-        f"[Visit the APFS Forecast site]({site_url})<br/><br/>"
-    )
+    return LINK_TMPL.format(csv=CSV_URL_TMPL.format(date=today), site=SITE_URL)
 
-def process_opportunities(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, str]]:
-    """Process opportunities and return new, disappeared, and updated seen IDs"""
+def process_opportunities(
+    df: pd.DataFrame, today: str
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, str], Dict[str, str]]:
+    """Process opportunities and return new, disappeared, updated seen IDs, and the changed entries"""
     # Load current state
     seen_ids = load_seen_ids()
-    today = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d")
     
-    # Get current IDs
-    current_ids = set(df["ID"].tolist())
+    # Current and seen IDs as int64 arrays (APFS IDs are numeric), falling
+    # back to strings if any ID isn't
+    try:
+        ids_arr = df["ID"].to_numpy(dtype=np.int64)
+        seen_arr = np.fromiter(map(int, seen_ids), dtype=np.int64, count=len(seen_ids))
+    except (TypeError, ValueError):
+        ids_arr = df["ID"].astype(str).to_numpy(dtype=object)
+        seen_arr = np.fromiter(seen_ids, dtype=object, count=len(seen_ids))
+    current_ids = ids_arr.astype(str).tolist()
     
     # Find new opportunities
-    new_mask = [row_id not in seen_ids for row_id in df["ID"]]
-    new_df = df.loc[new_mask]
+    new_mask = ~np.isin(ids_arr, seen_arr, assume_unique=True)
+    new_df = df.iloc[new_mask]
     
     # Find disappeared opportunities
-    disappeared_ids = set(seen_ids.keys()) - current_ids
+    disappeared_ids = np.setdiff1d(seen_arr, ids_arr, assume_unique=True).astype(str)
     disappeared_df = pd.DataFrame()
-    if disappeared_ids:
+    if disappeared_ids.size:
         # Load the last known state of disappeared opportunities
         try:
-            last_csv = os.path.join(data_dir, "filtered_forecast.csv")
-            historical_df = pd.read_csv(last_csv)
-            disappeared_df = historical_df[historical_df["APFS Number"].isin(disappeared_ids)]
-            # Rename column to match current df
-            disappeared_df = disappeared_df.rename(columns={"APFS Number": "ID"})
-        except (FileNotFoundError, pd.errors.EmptyDataError):
+            # Read only the columns the summary blocks need, and only
+            # convert the disappeared rows to pandas
+            historical = pacsv.read_csv(
+                PATHS.latest_csv,
+                # Description values contain embedded newlines
+                parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=list(HISTORY_COLUMNS),
+                    include_missing_columns=True,
+                    column_types={"APFS Number": pa.string()},
+                ),
+            )
+            mask = pc.is_in(historical["APFS Number"], value_set=pa.array(disappeared_ids, pa.string()))
+            disappeared_df = historical.filter(mask).to_pandas()
+            # Rename columns back to the API keys used by the current df
+            # (summary fields not in the CSV come back missing and render as None)
+            disappeared_df = disappeared_df.rename(columns=API_COLUMNS).reindex(columns=("ID",) + SUMMARY_COLUMNS)
+            disappeared_df["DOLLAR_RANGE"] = disappeared_df["DOLLAR_RANGE"].map(parse_dollar_range)
+        except (FileNotFoundError, pa.ArrowInvalid):
             logger.warning("Could not load historical data for disappeared opportunities")
     
     # Update seen IDs
-    for row_id in current_ids:
-        seen_ids[str(row_id)] = today
+    seen_updates = dict.fromkeys(current_ids, today)
+    seen_ids |= seen_updates
     
-    return new_df, disappeared_df, seen_ids
+    return new_df, disappeared_df, seen_ids, seen_updates
 
 def main():
     logger.info("Run started")
+    now = datetime.now(TZ)
+    today = now.strftime("%Y-%m-%d")
     try:
-        # Fetch & normalize
-        df = fetch_forecast()
-        logger.info(f"Available columns from API: {sorted(df.columns.tolist())}")
-        df.columns = df.columns.str.upper()
-
-        # Filter on NAICS
-        target = "541612 - Human Resources Consulting Services"
-        df_filtered = df[df["NAICS"] == target]
+        # Fetch the target NAICS rows, already normalized
+        target      = "541612 - Human Resources Consulting Services"
+        df_filtered, validators = fetch_forecast(target, load_validators())
+        if df_filtered is None:
+            logger.info("Forecast unchanged since last run—nothing to do.")
+            return
         logger.info(f"Rows after filter: {len(df_filtered)}")
 
         # Process opportunities
-        new_df, disappeared_df, seen_ids = process_opportunities(df_filtered)
+        new_df, disappeared_df, seen_ids, seen_updates = process_opportunities(df_filtered, today)
         
-        # Save state
-        save_seen_ids(seen_ids)
-
-        # Get today's date for filenames
-        today = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d")
+        # Save state (only the rows that changed this run)
+        save_seen_ids(seen_updates)
 
         # Write filtered CSV
-        dated_output_path = os.path.join(data_dir, f"filtered_forecast_{today}.csv")
-        latest_output_path = os.path.join(data_dir, "filtered_forecast.csv")
+        dated_output_path = PATHS.dated_csv_tmpl.format(date=today)
+        latest_output_path = PATHS.latest_csv
         
-        # Define target schema and rename columns as in original script
-        desired_columns = [
-            "APFS Number", "NAICS", "Component", "Title", "Contract Type",
-            "Contract Vehicle", "Dollar Range", "Small Business Set-Aside",
-            "Small Business Program", "Contract Status", "Contract Number",
-            "Contractor", "Place of Performance City", "Place of Performance State",
-            "Primary Contact First Name", "Primary Contact Last Name",
-            "Primary Contact Phone", "Primary Contact Email", "Description",
-            "Award Quarter", "Estimated Solicitation Release",
-            "Forecast Published", "Forecast Previously Published"
-        ]
-
-        rename_map = {
-            "ID": "APFS Number",
-            "NAICS": "NAICS",
-            "ORGANIZATION": "Component",
-            "REQUIREMENTS_TITLE": "Title",
-            "CONTRACT_TYPE": "Contract Type",
-            "CONTRACT_VEHICLE": "Contract Vehicle",
-            "DOLLAR_RANGE": "Dollar Range",
-            "SMALL_BUSINESS_SET_ASIDE": "Small Business Set-Aside",
-            "SMALL_BUSINESS_PROGRAM": "Small Business Program",
-            "CONTRACT_STATUS": "Contract Status",
-            "CONTRACT_NUMBER": "Contract Number",
-            "CONTRACTOR": "Contractor",
-            "PLACE_OF_PERFORMANCE_CITY": "Place of Performance City",
-            "PLACE_OF_PERFORMANCE_STATE": "Place of Performance State",
-            "REQUIREMENTS_CONTACT_FIRST_NAME": "Primary Contact First Name",
-            "REQUIREMENTS_CONTACT_LAST_NAME": "Primary Contact Last Name",
-            "REQUIREMENTS_CONTACT_PHONE": "Primary Contact Phone",
-            "REQUIREMENTS_CONTACT_EMAIL": "Primary Contact Email",
-            "REQUIREMENT": "Description",
-            "AWARD_QUARTER": "Award Quarter",
-            "ESTIMATED_SOLICITATION_RELEASE_DATE": "Estimated Solicitation Release",
-            "PUBLISH_DATE": "Forecast Published",
-            "PREVIOUS_PUBLISH_DATE": "Forecast Previously Published"
-        }
-
         # Transform and save DataFrame
-        df_export = df_filtered.rename(mapper=rename_map, axis=1)
-        df_export = df_export[desired_columns]
-        df_export.to_csv(dated_output_path, index=False)
-        df_export.to_csv(latest_output_path, index=False)
+        df_export = df_filtered.rename(columns=RENAME_MAP).reindex(columns=DESIRED_COLUMNS)
+        write_csv(df_export, dated_output_path)
+        publish_latest(dated_output_path, latest_output_path)
         logger.info(f"Wrote filtered data to {dated_output_path} and {latest_output_path}")
 
-        # Post new opportunities
+        # Build one Teams message: combined header and links, then a section per category
+        counts = {}
+        sections = []
         if len(new_df) > 0:
-            new_blocks = [format_opportunity_block(row) for _, row in new_df.iterrows()]
-            new_message = (
-                get_header(len(new_blocks), "new") +
-                get_links_html(today) +
-                "<br/><br/>".join(new_blocks)
-            )
-            post_to_teams(teams_webhook, new_message)
-            logger.info(f"Posted {len(new_blocks)} new opportunities")
+            new_blocks = format_opportunity_blocks(new_df).tolist()
+            counts["new"] = len(new_blocks)
+            sections.append(get_section_header(len(new_blocks), "new") + "<br/><br/>".join(new_blocks))
+            logger.info(f"Prepared {len(new_blocks)} new opportunities")
 
-        # Post disappeared opportunities
         if len(disappeared_df) > 0:
-            disappeared_blocks = [
-                format_disappeared_block(row, seen_ids[str(row["ID"])])
-                for _, row in disappeared_df.iterrows()
-            ]
-            disappeared_message = (
-                get_header(len(disappeared_blocks), "disappeared") +
-                get_links_html(today) +
+            disappeared_blocks = format_disappeared_blocks(disappeared_df, seen_ids).tolist()
+            counts["disappeared"] = len(disappeared_blocks)
+            sections.append(
+                get_section_header(len(disappeared_blocks), "disappeared") +
                 "<br/><br/>".join(disappeared_blocks)
             )
-            post_to_teams(teams_webhook, disappeared_message)
-            logger.info(f"Posted {len(disappeared_blocks)} disappeared opportunities")
+            logger.info(f"Prepared {len(disappeared_blocks)} disappeared opportunities")
+
+        # Post both sections in a single request
+        if sections:
+            message = (
+                get_header(counts, now) +
+                get_links_html(today) +
+                "<br/><br/>---<br/><br/>".join(sections)
+            )
+            post_to_teams(teams_webhook, message)
+
+        # Only remember validators once everything above has succeeded
+        save_validators(validators)
 
         logger.info("Run completed successfully")
 